@@ -75,6 +75,9 @@ class BrickMap:
         map (list): A 3D array of bricks. Starts with a bottom plate (z=0).
     """
 
+    # Width and depth of the cells of the spatial index used by bricks_in_box.
+    GRID_CELL_SIZE = 2
+
     def to_dict(self):
         """Convert BrickMap to a JSON-serializable dictionary."""
         return {
@@ -110,6 +113,79 @@ class BrickMap:
         self.timestamp = timestamp
         self.bricks = []
 
+    @property
+    def bricks(self):
+        return self._bricks
+
+    @bricks.setter
+    def bricks(self, bricks):
+        # Only reassignment is tracked. A tuple rules out adding or removing bricks in place,
+        # but changing the points of a brick still leaves the index stale.
+        self._bricks = tuple(bricks)
+        self._layer_index = None
+        self._grid_index = None
+
+    def build_index(self):
+        """
+        Build the spatial index used by bricks_in_layer and bricks_in_box. Queries build it
+        on first use, call this to pay the cost up front.
+
+        The layer index maps each y value to the indices of the bricks occupying it. The grid
+        index buckets each layer into GRID_CELL_SIZE x GRID_CELL_SIZE cells, mapping
+        (y, x // GRID_CELL_SIZE, z // GRID_CELL_SIZE) to the indices of the bricks in that cell.
+        """
+        layer_index = {}
+        grid_index = {}
+        for brick_idx, brick in enumerate(self.bricks):
+            for y in {point.y for point in brick.points}:
+                layer_index.setdefault(y, []).append(brick_idx)
+            for key in {self._grid_cell(point) for point in brick.points}:
+                grid_index.setdefault(key, []).append(brick_idx)
+        self._layer_index = layer_index
+        self._grid_index = grid_index
+
+    @staticmethod
+    def _grid_cell(point: Point):
+        return point.y, point.x // BrickMap.GRID_CELL_SIZE, point.z // BrickMap.GRID_CELL_SIZE
+
+    def bricks_in_layer(self, y):
+        """Return the bricks occupying the layer at height y."""
+        if self._layer_index is None:
+            self.build_index()
+        return [self.bricks[brick_idx] for brick_idx in self._layer_index.get(y, [])]
+
+    def bricks_in_box(self, min_point: Point, max_point: Point):
+        """Return the bricks with at least one point inside the box spanned by min_point and max_point (inclusive)."""
+        if self._grid_index is None:
+            self.build_index()
+        min_cell = self._grid_cell(min_point)
+        max_cell = self._grid_cell(max_point)
+        box_cells = 1
+        for low, high in zip(min_cell, max_cell):
+            box_cells *= max(0, high - low + 1)
+
+        # Visit the cells of the box, or the occupied cells if there are fewer of those
+        if box_cells <= len(self._grid_index):
+            cells = [(y, x, z)
+                     for y in range(min_cell[0], max_cell[0] + 1)
+                     for x in range(min_cell[1], max_cell[1] + 1)
+                     for z in range(min_cell[2], max_cell[2] + 1)]
+        else:
+            cells = [key for key in self._grid_index
+                     if all(low <= value <= high for low, value, high in zip(min_cell, key, max_cell))]
+
+        matching = set()
+        for key in cells:
+            for brick_idx in self._grid_index.get(key, []):
+                if brick_idx in matching:
+                    continue
+                if any(min_point.x <= p.x <= max_point.x and
+                       min_point.y <= p.y <= max_point.y and
+                       min_point.z <= p.z <= max_point.z
+                       for p in self.bricks[brick_idx].points):
+                    matching.add(brick_idx)
+        return [self.bricks[brick_idx] for brick_idx in sorted(matching)]
+
     def validate(self):
         """Validate the BrickMap for consistency and correctness."""
         validation_errors = []
@@ -1,20 +1,52 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, g
+import json
 import logging
+import math
 import os
+import sys
+import threading
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
 logging.basicConfig(level=logging.INFO)
 
+from Profiling import start_request_profile, finish_request_profile
+
+@app.before_request
+def before_request():
+    g.profile = start_request_profile(request.headers)
+
 @app.after_request
 def after_request(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY'
     response.headers['X-XSS-Protection'] = '1; mode=block'
+
+    profile = g.get('profile')
+    if profile is not None:
+        # Stopped first, so that re-parsing the payloads is not part of the profile
+        profile.stop()
+        profile.map_size = map_size(request.get_json(silent=True)) or map_size(response.get_json(silent=True))
     return response
 
-from Brick import BrickMap, Brick
+@app.teardown_request
+def teardown_request(exception):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        finish_request_profile(profile, request.method, route)
+
+def map_size(data):
+    """Return the number of bricks in a map payload, or None if it holds no map."""
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get('map'), dict):
+        data = data['map']
+    bricks = data.get('bricks')
+    return len(bricks) if isinstance(bricks, list) else None
+
+from Brick import BrickMap, Brick, Point
 from Storage import MapStorage
 
 from datetime import datetime
@@ -47,6 +79,17 @@ views = [
 # TODO: Remove this and replace with sane overwrite solution
 last_failed_save_attempt: dict[str, datetime] = {}
 
+# Parsed and indexed maps for brick queries, keyed by (map_id, version), oldest first.
+MAX_INDEXED_MAPS = 64
+indexed_maps: dict[tuple[str, str], BrickMap] = {}
+indexed_maps_lock = threading.Lock()
+
+# Seconds a single analysis request may search for, whatever budget the client asks for.
+MAX_ANALYSIS_BUDGET = float(os.environ.get('MAX_ANALYSIS_BUDGET', 10))
+# Analyses running at once. Further analysis requests are turned away until one finishes.
+MAX_CONCURRENT_ANALYSES = int(os.environ.get('MAX_CONCURRENT_ANALYSES', 2))
+analysis_slots = threading.BoundedSemaphore(MAX_CONCURRENT_ANALYSES)
+
 @app.route('/caaluza')
 def main_menu():
     """Main menu page with Play and Edit buttons."""
@@ -132,6 +175,63 @@ def load_map(map_id):
     return jsonify({'map_id': map_id, 'map': map_data.to_dict()}), 200
 
 
+@app.route('/caaluza/map/<string:map_id>/bricks', methods=['GET'])
+def query_map_bricks(map_id):
+    """Return the bricks of a map in a single layer (?y=) or inside a bounding box (?min_x=&max_x=&...)."""
+    map_id = map_id.strip().lower()
+    version = storage.map_version(map_id)
+
+    if version is None:
+        return jsonify({'error': 'Map not found'}), 404
+    if request.if_none_match.contains(version):
+        response = app.response_class(status=304)
+        response.set_etag(version)
+        return response
+
+    map_data, version = get_indexed_map(map_id, version)
+    if map_data is None:
+        return jsonify({'error': 'Map not found'}), 404
+    try:
+        y = request.args.get('y', None)
+        if y is not None:
+            bricks = map_data.bricks_in_layer(int(y))
+        else:
+            min_point = Point(*(int(request.args.get(f'min_{axis}', -sys.maxsize)) for axis in 'xyz'))
+            max_point = Point(*(int(request.args.get(f'max_{axis}', sys.maxsize)) for axis in 'xyz'))
+            bricks = map_data.bricks_in_box(min_point, max_point)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {str(e)}'}), 400
+
+    response = jsonify({'map_id': map_id, 'version': version, 'bricks': [brick.to_dict() for brick in bricks]})
+    response.set_etag(version)
+    return response
+
+def get_indexed_map(map_id, version):
+    """
+    Return the indexed BrickMap for a map version and that version, loading and caching it on first use.
+    The map may have been saved again since the version was read, so the version actually loaded is returned.
+    """
+    with indexed_maps_lock:
+        brick_map = indexed_maps.get((map_id, version))
+    if brick_map is not None:
+        return brick_map, version
+
+    data, version = storage.load_map_data(map_id)
+    if data is None:
+        return None, None
+    brick_map = BrickMap.from_dict(json.loads(data))
+    brick_map.build_index()
+    key = (map_id, version)
+    with indexed_maps_lock:
+        # Older versions of the map will not be asked for again
+        for stale_key in [k for k in indexed_maps if k[0] == map_id]:
+            del indexed_maps[stale_key]
+        indexed_maps[key] = brick_map
+        while len(indexed_maps) > MAX_INDEXED_MAPS:
+            del indexed_maps[next(iter(indexed_maps))]
+    return brick_map, version
+
+
 @app.route('/caaluza/generate', methods=['GET'])
 def generate_map():
     from Mapgenerator.Mapgenerator import generate_map as genmap
@@ -178,6 +278,55 @@ def validate_map():
     except Exception as e:
         return jsonify({'valid': False, 'errors': [{'type': 'parsing_error', 'message': str(e), 'offending_bricks': []}]}), 200
 
+def analyze(brick_map: BrickMap):
+    """Count the builds matching the map from the requested views (?views=Top,North&budget=10&limit=2)."""
+    from Mapgenerator.Solver import analyze_map
+
+    view_names = request.args.get('views', ",".join(view['name'] for view in views)).split(',')
+    try:
+        time_budget = float(request.args.get('budget', MAX_ANALYSIS_BUDGET))
+        if not math.isfinite(time_budget) or time_budget <= 0:
+            raise ValueError("budget must be a positive number of seconds")
+        max_solutions = request.args.get('limit', None)
+        max_solutions = int(max_solutions) if max_solutions is not None else None
+        if max_solutions is not None and max_solutions < 1:
+            raise ValueError("limit must be at least 1")
+    except ValueError as e:
+        return jsonify({'error': f'Invalid analysis request: {str(e)}'}), 400
+
+    if not analysis_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many analyses running, try again later'}), 503
+    try:
+        # Searched in the request thread, so that one request cannot occupy every core
+        result = analyze_map(brick_map, view_names, time_budget=min(time_budget, MAX_ANALYSIS_BUDGET),
+                             max_solutions=max_solutions, processes=1)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid analysis request: {str(e)}'}), 400
+    finally:
+        analysis_slots.release()
+
+    return jsonify({'views': view_names, **result.to_dict()}), 200
+
+@app.route('/caaluza/analyze', methods=['POST'])
+def analyze_posted_map():
+    """Analyze how uniquely the views determine the posted map."""
+    data = request.get_json()
+
+    try:
+        brick_map = BrickMap.from_dict(data)
+    except Exception as e:
+        return jsonify({'error': f'Invalid map data: {str(e)}'}), 400
+    return analyze(brick_map)
+
+@app.route('/caaluza/map/<string:map_id>/analysis', methods=['GET'])
+def analyze_stored_map(map_id):
+    """Analyze how uniquely the views determine a stored map."""
+    map_data = storage.load_map(map_id.strip().lower())
+
+    if not map_data:
+        return jsonify({'error': 'Map not found'}), 404
+    return analyze(map_data)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
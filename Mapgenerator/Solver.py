@@ -0,0 +1,443 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+import multiprocessing
+import os
+import time
+
+from Mapgenerator.Mapgenerator import BrickDef
+
+# Camera views, named as in Controller.views. Each view maps a point (x, y, z) to a
+# cell in its projection using the two cell axes. Along the depth axis the point
+# nearest to the camera is the one that is visible: the largest coordinate if the
+# sign is 1, the smallest if it is -1.
+VIEW_AXES = {
+    "Top": ((0, 2), 1, 1),
+    "North": ((0, 1), 2, -1),
+    "South": ((0, 1), 2, 1),
+    "West": ((2, 1), 0, -1),
+    "East": ((2, 1), 0, 1),
+}
+
+# How many search nodes to expand between checks of the time budget and stop event.
+DEADLINE_CHECK_INTERVAL = 256
+
+# The search is split into at least this many tasks per worker process.
+TASKS_PER_WORKER = 4
+
+
+@dataclass
+class SolveResult:
+    """
+    The outcome of counting the builds consistent with a set of view projections.
+
+    Attributes:
+        solutions (int): The number of consistent builds found.
+        complete (bool): False if the search was cut short by the time budget or solution limit.
+        nodes (int): The number of placements tried, a measure of puzzle difficulty.
+        elapsed (float): Wall clock time spent searching, in seconds.
+    """
+    solutions: int
+    complete: bool
+    nodes: int
+    elapsed: float
+
+    @property
+    def unique(self):
+        return self.complete and self.solutions == 1
+
+    def to_dict(self):
+        return {
+            'solutions': self.solutions,
+            'complete': self.complete,
+            'unique': self.unique,
+            'nodes': self.nodes,
+            'elapsed': self.elapsed
+        }
+
+
+def cell(point, view):
+    (u, v), _, _ = VIEW_AXES[view]
+    return point[u], point[v]
+
+
+def nearness(point, view):
+    _, depth_axis, sign = VIEW_AXES[view]
+    return sign * point[depth_axis]
+
+
+def project(colored_points: dict, view: str) -> dict:
+    """Project a mapping of (x, y, z) to color onto the visible color per cell of a view."""
+    if view not in VIEW_AXES:
+        raise ValueError(f"Unknown view: {view}")
+    projection = {}
+    nearest = {}
+    for point, color in colored_points.items():
+        c = cell(point, view)
+        if c not in nearest or nearness(point, view) > nearest[c]:
+            nearest[c] = nearness(point, view)
+            projection[c] = color
+    return projection
+
+
+def _brick_points(brick):
+    return [(p.x, p.y, p.z) for p in brick.points]
+
+
+def puzzle_from_map(brick_map, view_names: list[str]):
+    """Return the projections of a BrickMap for the given views and the pieces used to build it."""
+    colored_points = {point: brick.color for brick in brick_map.bricks for point in _brick_points(brick)}
+    projections = {view: project(colored_points, view) for view in view_names}
+
+    pieces = []
+    for brick in brick_map.bricks:
+        xs = [p[0] for p in _brick_points(brick)]
+        zs = [p[2] for p in _brick_points(brick)]
+        width = max(xs) - min(xs) + 1
+        depth = max(zs) - min(zs) + 1
+        pieces.append(BrickDef(min(width, depth), max(width, depth), brick.color, frozenset()))
+    return projections, pieces
+
+
+class Puzzle:
+    """
+    The search space for rebuilding a map from its view projections.
+
+    Holds the candidate placements of every piece, pruned to those that fit the
+    silhouettes of all views. Pieces are ordered with the most constrained first,
+    identical pieces kept adjacent so that their placements can be ordered to
+    avoid counting the same build more than once.
+    """
+
+    def __init__(self, projections: dict, pieces: list[BrickDef], width=6, depth=6, height=None):
+        for view in projections:
+            if view not in VIEW_AXES:
+                raise ValueError(f"Unknown view: {view}")
+        if height is None:
+            side_heights = [v + 1 for view, projection in projections.items() if view != "Top"
+                            for (_, v) in projection]
+            height = max(side_heights) if side_heights else len(pieces)
+
+        self.projections = projections
+        self.width = width
+        self.depth = depth
+
+        # Search the baseplate, widened to bricks overhanging it as seen in the projections
+        self.bounds = [[0, width - 1], [0, height - 1], [0, depth - 1]]
+        for view, projection in projections.items():
+            axes, _, _ = VIEW_AXES[view]
+            for c in projection:
+                for axis, value in zip(axes, c):
+                    self.bounds[axis][0] = min(self.bounds[axis][0], value)
+                    self.bounds[axis][1] = max(self.bounds[axis][1], value)
+        (min_x, max_x), (min_y, max_y), (min_z, max_z) = self.bounds
+
+        self.allowed = {
+            (x, y, z)
+            for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1) for z in range(min_z, max_z + 1)
+            if all(cell((x, y, z), view) in projection for view, projection in projections.items())
+        }
+        # The allowed positions on each line of sight, nearest to the camera first
+        self.lines = {view: {} for view in projections}
+        for view in projections:
+            for point in sorted(self.allowed, key=lambda p: -nearness(p, view)):
+                self.lines[view].setdefault(cell(point, view), []).append(point)
+
+        keyed = [((piece.width, piece.depth, piece.color), self._candidates(piece)) for piece in pieces]
+        keyed.sort(key=lambda item: (len(item[1]), item[0]))
+        self.keys = [key for key, _ in keyed]
+        self.colors = [key[2] for key in self.keys]
+        self.sizes = [key[0] * key[1] for key in self.keys]
+        self.candidates = [candidates for _, candidates in keyed]
+
+    def _candidates(self, piece: BrickDef):
+        candidates = []
+        for width, depth in {(piece.width, piece.depth), (piece.depth, piece.width)}:
+            (min_x, max_x), (min_y, max_y), (min_z, max_z) = self.bounds
+            for x0 in range(min_x, max_x - width + 2):
+                for z0 in range(min_z, max_z - depth + 2):
+                    for y in range(min_y, max_y + 1):
+                        points = tuple((x0 + x, y, z0 + z) for x in range(width) for z in range(depth))
+                        if all(p in self.allowed for p in points) and not self._hidden_color_clash(points, piece.color):
+                            candidates.append(points)
+        return candidates
+
+    def _hidden_color_clash(self, points, color):
+        """A point nearest to the camera on its line of sight must have the color seen there."""
+        for view, projection in self.projections.items():
+            for point in points:
+                c = cell(point, view)
+                if self.lines[view][c][0] == point and projection[c] != color:
+                    return True
+        return False
+
+
+class _Search:
+    """Depth-first search over the placements of a Puzzle, with incremental pruning state."""
+
+    def __init__(self, puzzle: Puzzle, deadline=None, max_solutions=None, stop_event=None, shared_solutions=None):
+        self.puzzle = puzzle
+        self.deadline = deadline
+        self.max_solutions = max_solutions
+        self.stop_event = stop_event
+        self.shared_solutions = shared_solutions
+        self.occupied = {}
+        self.chosen = []
+        self.covered = {view: {} for view in puzzle.projections}
+        self.remaining_colors = {}
+        for color in puzzle.colors:
+            self.remaining_colors[color] = self.remaining_colors.get(color, 0) + 1
+        self.remaining_points = sum(puzzle.sizes)
+        self.solutions = 0
+        self.nodes = 0
+        self.stopped = False
+
+    def place(self, piece_idx, points):
+        color = self.puzzle.colors[piece_idx]
+        for point in points:
+            self.occupied[point] = color
+            for view, covered in self.covered.items():
+                c = cell(point, view)
+                covered[c] = covered.get(c, 0) + 1
+        self.chosen.append(points)
+        self.remaining_colors[color] -= 1
+        self.remaining_points -= len(points)
+
+    def remove(self, piece_idx, points):
+        color = self.puzzle.colors[piece_idx]
+        for point in points:
+            del self.occupied[point]
+            for view, covered in self.covered.items():
+                c = cell(point, view)
+                covered[c] -= 1
+                if covered[c] == 0:
+                    del covered[c]
+        self.chosen.pop()
+        self.remaining_colors[color] += 1
+        self.remaining_points += len(points)
+
+    def consistent(self, points):
+        """Check whether the placement of points can still lead to a build matching the projections."""
+        for view, projection in self.puzzle.projections.items():
+            uncovered = [c for c in projection if c not in self.covered[view]]
+            if len(uncovered) > self.remaining_points:
+                return False
+            if any(self.remaining_colors.get(projection[c], 0) == 0 for c in uncovered):
+                return False
+
+            for c in {cell(point, view) for point in points}:
+                line = self.puzzle.lines[view][c]
+                front = next(i for i, p in enumerate(line) if p in self.occupied)
+                if self.occupied[line[front]] != projection[c]:
+                    # Something of the visible color still has to be placed in front
+                    if self.remaining_colors.get(projection[c], 0) == 0:
+                        return False
+                    if front == 0:
+                        return False
+        return True
+
+    def supported(self):
+        """Each brick must rest on the base or touch another brick above or below, as in BrickMap.validate."""
+        for points in self.chosen:
+            if not any(self._on_baseplate(x, y, z) or (x, y - 1, z) in self.occupied or (x, y + 1, z) in self.occupied
+                       for (x, y, z) in points):
+                return False
+        return True
+
+    def _on_baseplate(self, x, y, z):
+        return y == 0 and 0 <= x < self.puzzle.width and 0 <= z < self.puzzle.depth
+
+    def matches(self):
+        return all(project(self.occupied, view) == projection
+                   for view, projection in self.puzzle.projections.items())
+
+    def start(self, piece_idx, previous_candidate_idx):
+        """Identical pieces are placed in increasing candidate order, so a build is only counted once."""
+        if 0 < piece_idx < len(self.puzzle.keys) and self.puzzle.keys[piece_idx] == self.puzzle.keys[piece_idx - 1]:
+            return previous_candidate_idx + 1
+        return 0
+
+    def replay(self, prefix):
+        """Place the first pieces at the given candidates, as found by split_search."""
+        for piece_idx, candidate_idx in enumerate(prefix):
+            self.place(piece_idx, self.puzzle.candidates[piece_idx][candidate_idx])
+
+    def undo(self, prefix):
+        for piece_idx in reversed(range(len(prefix))):
+            self.remove(piece_idx, self.chosen[-1])
+
+    def should_stop(self):
+        """Check the time budget and stop event every DEADLINE_CHECK_INTERVAL nodes."""
+        if self.nodes % DEADLINE_CHECK_INTERVAL != 0:
+            return False
+        if self.deadline is not None and time.time() > self.deadline:
+            return True
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def found_solution(self):
+        """Count a solution, here and across the workers, and stop everywhere once max_solutions is reached."""
+        self.solutions += 1
+        total = self.solutions
+        if self.shared_solutions is not None:
+            with self.shared_solutions.get_lock():
+                self.shared_solutions.value += 1
+                total = self.shared_solutions.value
+        if self.max_solutions is not None and total >= self.max_solutions:
+            self.stopped = True
+            if self.stop_event is not None:
+                self.stop_event.set()
+
+    def run(self, piece_idx=0, start=0):
+        """Count the solutions extending the current state, placing pieces from piece_idx on."""
+        puzzle = self.puzzle
+        if piece_idx == len(puzzle.keys):
+            if self.matches() and self.supported():
+                self.found_solution()
+            return
+
+        for candidate_idx in range(start, len(puzzle.candidates[piece_idx])):
+            if self.stopped:
+                return
+            self.nodes += 1
+            if self.should_stop():
+                self.stopped = True
+                return
+
+            points = puzzle.candidates[piece_idx][candidate_idx]
+            if any(point in self.occupied for point in points):
+                continue
+            self.place(piece_idx, points)
+            if self.consistent(points):
+                self.run(piece_idx + 1, self.start(piece_idx + 1, candidate_idx))
+            self.remove(piece_idx, points)
+
+
+def split_search(puzzle: Puzzle, min_tasks):
+    """
+    Expand the search level by level until there are at least min_tasks consistent
+    prefixes, or all pieces are placed. A prefix holds the candidate index of each of
+    the first pieces. Returns the prefixes and the number of nodes expanded.
+    """
+    search = _Search(puzzle)
+    prefixes = [()]
+    for piece_idx in range(len(puzzle.keys)):
+        if len(prefixes) >= min_tasks:
+            break
+        expanded = []
+        for prefix in prefixes:
+            search.replay(prefix)
+            start = search.start(piece_idx, prefix[-1]) if prefix else 0
+            for candidate_idx in range(start, len(puzzle.candidates[piece_idx])):
+                search.nodes += 1
+                points = puzzle.candidates[piece_idx][candidate_idx]
+                if any(point in search.occupied for point in points):
+                    continue
+                search.place(piece_idx, points)
+                if search.consistent(points):
+                    expanded.append(prefix + (candidate_idx,))
+                search.remove(piece_idx, points)
+            search.undo(prefix)
+        prefixes = expanded
+    return prefixes, search.nodes
+
+
+_worker_puzzle: Puzzle = None
+_worker_stop_event = None
+_worker_solutions = None
+
+
+def _init_worker(puzzle: Puzzle, stop_event, solutions):
+    global _worker_puzzle, _worker_stop_event, _worker_solutions
+    _worker_puzzle = puzzle
+    _worker_stop_event = stop_event
+    _worker_solutions = solutions
+
+
+def _search_prefix(prefix, deadline, max_solutions):
+    """Count the solutions extending a prefix from split_search."""
+    search = _Search(_worker_puzzle, deadline, max_solutions, _worker_stop_event, _worker_solutions)
+    search.replay(prefix)
+    start = search.start(len(prefix), prefix[-1]) if prefix else 0
+    search.run(len(prefix), start)
+    return search.solutions, search.nodes, not search.stopped
+
+
+def count_solutions(projections: dict, pieces: list[BrickDef], width=6, depth=6, height=None,
+                    time_budget=None, max_solutions=None, processes=None) -> SolveResult:
+    """
+    Count the builds using exactly the given pieces whose projections match the given ones.
+
+    Args:
+        projections: Maps view name to a projection as returned by project().
+        pieces: The bricks available to the player, e.g. from get_available_bricks.
+        width, depth: The size of the baseplate.
+        height: The number of layers to search. Derived from the side views if not given.
+        time_budget: Seconds after which the search stops with an incomplete result.
+        max_solutions: Stop once this many solutions are found, e.g. 2 to check uniqueness.
+        processes: The number of worker processes. The search is split into partial builds
+            of the first pieces, which are spread over the pool. Runs in this process if 1.
+    """
+    if max_solutions is not None and max_solutions < 1:
+        raise ValueError("max_solutions must be at least 1")
+    if time_budget is not None and not time_budget > 0:
+        raise ValueError("time_budget must be positive")
+    start_time = time.time()
+    deadline = start_time + time_budget if time_budget is not None else None
+    puzzle = Puzzle(projections, pieces, width, depth, height)
+
+    if not pieces:
+        solved = all(len(projection) == 0 for projection in projections.values())
+        return SolveResult(int(solved), True, 0, time.time() - start_time)
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        search = _Search(puzzle, deadline, max_solutions)
+        search.run()
+        return SolveResult(search.solutions, not search.stopped, search.nodes, time.time() - start_time)
+
+    prefixes, nodes = split_search(puzzle, processes * TASKS_PER_WORKER)
+    solutions = 0
+    complete = True
+    # Tells the branches still running to give up once the result is known to be incomplete
+    stop_event = multiprocessing.Event()
+    # Solutions found by all branches so far, so that max_solutions holds across the pool
+    shared_solutions = multiprocessing.Value('i', 0)
+    with ProcessPoolExecutor(processes, initializer=_init_worker,
+                             initargs=(puzzle, stop_event, shared_solutions)) as executor:
+        pending = {executor.submit(_search_prefix, prefix, deadline, max_solutions) for prefix in prefixes}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                branch_solutions, branch_nodes, branch_complete = future.result()
+                solutions += branch_solutions
+                nodes += branch_nodes
+                complete = complete and branch_complete
+            if max_solutions is not None and solutions >= max_solutions:
+                complete = False
+            if not complete:
+                stop_event.set()
+                for future in pending:
+                    future.cancel()
+                break
+
+    if max_solutions is not None:
+        solutions = min(solutions, max_solutions)
+    return SolveResult(solutions, complete, nodes, time.time() - start_time)
+
+
+def analyze_map(brick_map, view_names: list[str], time_budget=None, max_solutions=None, processes=None) -> SolveResult:
+    """Count the builds of the pieces in a BrickMap that look the same as it from the given views."""
+    projections, pieces = puzzle_from_map(brick_map, view_names)
+    return count_solutions(projections, pieces, brick_map.width, brick_map.depth,
+                           time_budget=time_budget, max_solutions=max_solutions, processes=processes)
+
+
+def _analyze_single(args):
+    brick_map, view_names, time_budget, max_solutions = args
+    return analyze_map(brick_map, view_names, time_budget, max_solutions, processes=1)
+
+
+def analyze_maps(brick_maps: list, view_names: list[str], time_budget=None, max_solutions=None, processes=None) -> list[SolveResult]:
+    """Analyze many maps in parallel, one map per worker. Use the nodes of the results to rank them by difficulty."""
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(_analyze_single,
+                                 [(brick_map, view_names, time_budget, max_solutions) for brick_map in brick_maps]))
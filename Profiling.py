@@ -0,0 +1,166 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Profiling is off unless a dump directory is configured.
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+# Requests carrying this header are profiled with cProfile.
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Caaluza-Profile")
+# Fraction of requests profiled, e.g. 0.01. With PROFILE_SLOW_MS set, the fraction of
+# requests watched by the stack sampler (default all), otherwise profiled with cProfile
+# (default none).
+PROFILE_SAMPLE_RATE = float(os.environ["PROFILE_SAMPLE_RATE"]) if "PROFILE_SAMPLE_RATE" in os.environ else None
+# Requests slower than this many milliseconds get their stack samples dumped.
+PROFILE_SLOW_MS = float(os.environ["PROFILE_SLOW_MS"]) if "PROFILE_SLOW_MS" in os.environ else None
+# Interval of the stack sampler.
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+
+
+class StackSampler:
+    """Periodically samples the call stacks of registered threads into collapsed-stack counters."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets: dict[int, Counter] = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, thread_id):
+        """Start sampling a thread. Returns the counter its stacks are collected in."""
+        samples = Counter()
+        with self._condition:
+            self._targets[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return samples
+
+    def stop(self, thread_id):
+        with self._condition:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._targets:
+                    self._condition.wait()
+            time.sleep(self.interval)
+
+            frames = sys._current_frames()
+            with self._condition:
+                for thread_id, samples in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+
+
+def collapse(frame):
+    """Format a stack as a semicolon separated line of frames, outermost first."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class RequestProfile:
+    """Profiling data collected for a single request."""
+
+    def __init__(self, sampler: StackSampler, use_cprofile: bool):
+        self.sampler = sampler
+        self.thread_id = threading.get_ident()
+        self.start_time = time.perf_counter()
+        self.map_size = None
+        # Requests selected for cProfile are always dumped, the others only when slow
+        self.forced = use_cprofile
+        self.duration_ms = None
+        self.profile = None
+        if use_cprofile:
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # Another profiler is already active in this interpreter. From Python 3.12 this
+                # includes cProfile runs of concurrent requests, so only the stack samples are kept.
+                self.profile = None
+        self.samples = sampler.start(self.thread_id)
+
+    def stop(self):
+        """Stop profiling. Later calls do nothing."""
+        if self.duration_ms is not None:
+            return
+        if self.profile is not None:
+            self.profile.disable()
+        self.samples = self.sampler.stop(self.thread_id)
+        self.duration_ms = 1000 * (time.perf_counter() - self.start_time)
+
+    def finish(self, directory, method, route, slow_ms=None):
+        """Stop profiling and write the dumps. Returns the path of the written metadata, or None if skipped."""
+        self.stop()
+        samples = self.samples
+        duration_ms = self.duration_ms
+
+        if not self.forced and (slow_ms is None or duration_ms < slow_ms):
+            return None
+
+        route_tag = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        size_tag = f"{self.map_size}b" if self.map_size is not None else "nomap"
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{method}_{route_tag}_{size_tag}_{int(duration_ms)}ms"
+        base = os.path.join(directory, name)
+        os.makedirs(directory, exist_ok=True)
+
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in samples.items():
+                f.write(f"{stack} {count}\n")
+        if self.profile is not None:
+            pstats.Stats(self.profile).dump_stats(base + ".pstats")
+
+        with open(base + ".json", "w") as f:
+            json.dump({
+                'method': method,
+                'route': route,
+                'map_size': self.map_size,
+                'duration_ms': duration_ms,
+                'cprofile': self.profile is not None,
+                'samples': sum(samples.values())
+            }, f)
+        return base + ".json"
+
+
+_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def start_request_profile(headers) -> RequestProfile | None:
+    """Start profiling the current request if profiling is enabled and the request is selected."""
+    if PROFILE_DIR is None:
+        return None
+    if PROFILE_HEADER in headers:
+        return RequestProfile(_sampler, use_cprofile=True)
+
+    sample_rate = PROFILE_SAMPLE_RATE
+    if sample_rate is None:
+        sample_rate = 1.0 if PROFILE_SLOW_MS is not None else 0.0
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    # With a slow threshold, the stack samples are only kept for requests that turn out slow
+    return RequestProfile(_sampler, use_cprofile=PROFILE_SLOW_MS is None)
+
+
+def finish_request_profile(profile: RequestProfile, method, route):
+    """Write the dumps of a finished request. Failures are logged rather than failing the request."""
+    try:
+        return profile.finish(PROFILE_DIR, method, route, PROFILE_SLOW_MS)
+    except Exception:
+        logging.exception("Could not write the profile of %s %s", method, route)
+        return None
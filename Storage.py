@@ -1,4 +1,5 @@
 import sqlite3
+import hashlib
 from Brick import BrickMap, Point, Brick
 import json
 import os
@@ -23,27 +24,55 @@ class MapStorage:
                 CREATE TABLE IF NOT EXISTS maps (
                     id TEXT PRIMARY KEY,
                     data TEXT NOT NULL,
-                    author TEXT
+                    author TEXT,
+                    version TEXT
                 )
             """)
+            # Databases created before maps were versioned
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(maps)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE maps ADD COLUMN version TEXT")
+            rows = conn.execute("SELECT id, data FROM maps WHERE version IS NULL").fetchall()
+            conn.executemany("UPDATE maps SET version = ? WHERE id = ?",
+                             [(self._version(data), map_id) for map_id, data in rows])
+
+    @staticmethod
+    def _version(data):
+        """Tag a stored map with the hash of its JSON, so the tag changes whenever the map does."""
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
 
     def save_map(self, map_id, author, brick_map):
         """Save or update a map in the database."""
+        data = json.dumps(brick_map.to_dict())
         conn = sqlite3.connect(DB_FILE)
         with conn:
             conn.execute("""
-                INSERT INTO maps (id, data, author) VALUES (?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET data=excluded.data, author=excluded.author""", 
-                 (map_id, json.dumps(brick_map.to_dict()), author))
+                INSERT INTO maps (id, data, author, version) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data=excluded.data, author=excluded.author, version=excluded.version""", 
+                 (map_id, data, author, self._version(data)))
 
     def load_map(self, map_id):
         """Load a map from the database by its ID."""
+        data, _ = self.load_map_data(map_id)
+        if data is not None:
+            return BrickMap.from_dict(json.loads(data))
+        return None
+
+    def load_map_data(self, map_id):
+        """Load the unparsed JSON of a map and its version tag, without building the BrickMap."""
         conn = sqlite3.connect(DB_FILE)
-        cursor = conn.execute("SELECT data FROM maps WHERE id = ?", (map_id,))
+        cursor = conn.execute("SELECT data, version FROM maps WHERE id = ?", (map_id,))
         row = cursor.fetchone()
         if row is not None:
-            return BrickMap.from_dict(json.loads(row[0]))
-        return None
+            return row[0], row[1]
+        return None, None
+
+    def map_version(self, map_id):
+        """Return the version tag of a stored map without reading the map itself, or None if it does not exist."""
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.execute("SELECT version FROM maps WHERE id = ?", (map_id,))
+        row = cursor.fetchone()
+        return row[0] if row is not None else None
 
     def delete_map(self, map_id):
         """Delete a map from the database."""
@@ -0,0 +1,305 @@
+"""Load test harness simulating concurrent map editors.
+
+Each simulated editor repeatedly drops bricks onto a map, validates it, saves it
+(confirming the overwrite when the map already exists) and reloads it. The
+results are written as a JSON report with throughput, latency percentiles per
+route and the number of SQLite lock errors.
+
+The app is served from a separate process and the editors are spread over a
+pool of client processes, so that the measured latencies are not dominated by
+the clients and the server competing for the same interpreter.
+
+Usage:
+    python loadtest.py --users 20 --iterations 50 --entry passenger --output report.json
+    python loadtest.py --url http://127.0.0.1:5000 --users 10
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import runpy
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from Mapgenerator.Mapgenerator import generate_map, Config
+
+ENTRY_POINTS = ["controller", "passenger", "flask.wsgi"]
+
+# Logged by Flask with the traceback of a request that failed on a locked database
+LOCK_ERROR_MARKER = "OperationalError: database is locked"
+
+
+def load_application(entry):
+    """Import the WSGI application from one of the deployment entry points."""
+    if entry == "controller":
+        from Controller import app
+        return app
+    if entry == "passenger":
+        from passenger_wsgi import application
+        return application
+    if entry == "flask.wsgi":
+        return runpy.run_path(os.path.join(ROOT, "flask.wsgi"))["application"]
+    raise ValueError(f"Unknown entry point: {entry}")
+
+
+def serve(entry, port):
+    """Serve an entry point on a threaded werkzeug server until the process is terminated."""
+    from werkzeug.serving import make_server
+
+    application = load_application(entry)
+    # Only keep warnings and errors, such as the tracebacks of lock errors
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    make_server("127.0.0.1", port, application, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server_process(entry, log_file, db_path, timeout=30):
+    """Start an entry point in a server process. Returns the process and its base URL once it answers."""
+    port = free_port()
+    env = dict(os.environ, MAPS_DB_PATH=db_path)
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--entry", entry, "--port", str(port)],
+                               stdout=log_file, stderr=subprocess.STDOUT, env=env, cwd=ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {entry} exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/caaluza") as response:
+                response.read()
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Server for {entry} did not start within {timeout} seconds")
+
+
+def count_lock_errors(log_path):
+    """Count the requests that failed on a locked SQLite database according to the server log."""
+    with open(log_path, errors="replace") as f:
+        return sum(1 for line in f if LOCK_ERROR_MARKER in line)
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of the samples using the nearest-rank method."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def generated_map(name):
+    """Build a map in the format sent by the editor, with stacked bricks of mixed sizes."""
+    while True:
+        try:
+            brickdefs = generate_map(Config(random.randint(1, 12), random.randint(1, 4)))
+            break
+        except ValueError:
+            # The generator ran out of free spots for the sampled bricks
+            continue
+
+    bricks = []
+    for brickdef in brickdefs:
+        xs = [p.x for p in brickdef.points]
+        zs = [p.z for p in brickdef.points]
+        width = max(xs) - min(xs) + 1
+        depth = max(zs) - min(zs) + 1
+        width, depth = min(width, depth), max(width, depth)
+        bricks.append({
+            'color': brickdef.color,
+            'name': f"{width}x{depth} {brickdef.color}",
+            'points': [{'x': p.x, 'y': p.y, 'z': p.z} for p in brickdef.points]
+        })
+    return {
+        'metadata': {
+            'width': 6,
+            'height': max(p['y'] for brick in bricks for p in brick['points']) + 1,
+            'depth': 6,
+            'name': name,
+            'timestamp': None,
+            'author': name
+        },
+        'bricks': bricks
+    }
+
+
+class Editor:
+    """A simulated editor running drop -> validate -> save -> reload loops."""
+
+    def __init__(self, base_url, name, results):
+        self.base_url = base_url
+        self.name = name
+        self.results = results
+
+    def request(self, route, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                status = response.status
+                response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except urllib.error.URLError:
+            status = None
+        self.results.record(route, time.perf_counter() - start, status)
+        return status
+
+    def run(self, iterations):
+        map_id = f"loadtest_{self.name}"
+        for iteration in range(iterations):
+            map_data = generated_map(self.name)
+            self.request("POST /caaluza/validate", "POST", "/caaluza/validate", map_data)
+            status = self.request("POST /caaluza/map/<id>", "POST", f"/caaluza/map/{map_id}", map_data)
+            if status == 400:
+                # The map already exists or is invalid, saving again confirms an overwrite
+                self.request("POST /caaluza/map/<id>", "POST", f"/caaluza/map/{map_id}", map_data)
+            self.request("GET /caaluza/map/<id>", "GET", f"/caaluza/map/{map_id}")
+
+
+class Results:
+    """Thread-safe collection of request latencies per route."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, latency, status):
+        with self._lock:
+            self.latencies[route].append(latency)
+            if status is None or status >= 500:
+                self.errors[route] += 1
+
+    def merge(self, latencies, errors):
+        with self._lock:
+            for route, samples in latencies.items():
+                self.latencies[route].extend(samples)
+            for route, count in errors.items():
+                self.errors[route] += count
+
+    def report(self, duration):
+        routes = {}
+        for route, samples in self.latencies.items():
+            routes[route] = {
+                'count': len(samples),
+                'errors': self.errors[route],
+                'throughput_rps': len(samples) / duration,
+                'mean_ms': 1000 * sum(samples) / len(samples),
+                'p50_ms': 1000 * percentile(samples, 50),
+                'p95_ms': 1000 * percentile(samples, 95),
+                'p99_ms': 1000 * percentile(samples, 99),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            'duration_s': duration,
+            'requests': total,
+            'throughput_rps': total / duration if duration > 0 else 0.0,
+            'routes': routes,
+        }
+
+
+def _run_editors(base_url, names, iterations):
+    """Run a group of editors on threads in a client process. Returns their raw latencies and errors."""
+    results = Results()
+    threads = [threading.Thread(target=Editor(base_url, name, results).run, args=(iterations,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(results.latencies), dict(results.errors)
+
+
+def run_load(base_url, users, iterations, client_processes=None):
+    """Run the editor loops for all users concurrently, spread over client processes, and return the report."""
+    client_processes = min(users, client_processes or os.cpu_count() or 1)
+    names = [f"user{i}" for i in range(users)]
+    groups = [names[i::client_processes] for i in range(client_processes)]
+
+    results = Results()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(client_processes) as executor:
+        futures = [executor.submit(_run_editors, base_url, group, iterations) for group in groups]
+        for future in futures:
+            results.merge(*future.result())
+    return results.report(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help="Number of concurrent editors")
+    parser.add_argument('--iterations', type=int, default=20, help="Loops per editor")
+    parser.add_argument('--entry', choices=ENTRY_POINTS, default="controller",
+                        help="Entry point to serve locally")
+    parser.add_argument('--url', help="Test an already running app instead of starting one")
+    parser.add_argument('--client-processes', type=int, default=None,
+                        help="Processes to spread the editors over (default: one per core)")
+    parser.add_argument('--db', help="SQLite database for the started app (default: a fresh temporary one)")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.entry, args.port)
+        return
+
+    server = None
+    if args.url is None:
+        # Keep the load test away from the real map database, whatever MAPS_DB_PATH says
+        workdir = tempfile.mkdtemp()
+        db_path = args.db or os.path.join(workdir, "loadtest.sqlite")
+        log_path = os.path.join(workdir, "server.log")
+        log_file = open(log_path, "w")
+        server, base_url = start_server_process(args.entry, log_file, db_path)
+    else:
+        base_url = args.url.rstrip('/')
+
+    try:
+        report = run_load(base_url, args.users, args.iterations, args.client_processes)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            log_file.close()
+
+    report['users'] = args.users
+    report['iterations'] = args.iterations
+    report['target'] = base_url if args.url else args.entry
+    # Lock errors are read from the log of the server started here
+    report['sqlite_lock_errors'] = count_lock_errors(log_path) if server is not None else None
+    if server is not None:
+        report['server_log'] = log_path
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -113,6 +113,46 @@ class TestBrickMap(unittest.TestCase):
             BrickMap.from_dict(data)
         self.assertIn("Bricks data is required", str(context.exception))
 
+    def test_bricks_in_layer(self):
+        green_brick = Brick("green", "1x1 green", [Point(0, 1, 0)])
+        self.brick_map.bricks = [self.red_brick, green_brick]
+        self.assertEqual(self.brick_map.bricks_in_layer(0), [self.red_brick])
+        self.assertEqual(self.brick_map.bricks_in_layer(1), [green_brick])
+        self.assertEqual(self.brick_map.bricks_in_layer(2), [])
+
+    def test_bricks_in_layer_after_reassigning_bricks(self):
+        self.brick_map.bricks = [self.red_brick]
+        self.assertEqual(self.brick_map.bricks_in_layer(0), [self.red_brick])
+        self.brick_map.bricks = [self.blue_brick]
+        self.assertEqual(self.brick_map.bricks_in_layer(0), [self.blue_brick])
+
+    def test_bricks_cannot_change_in_place(self):
+        self.brick_map.bricks = [self.red_brick]
+        with self.assertRaises(AttributeError):
+            self.brick_map.bricks.append(self.blue_brick)
+        self.assertEqual(self.brick_map.bricks_in_layer(0), [self.red_brick])
+
+    def test_bricks_in_box(self):
+        green_brick = Brick("green", "1x1 green", [Point(4, 1, 4)])
+        self.brick_map.bricks = [self.red_brick, green_brick]
+        self.assertEqual(self.brick_map.bricks_in_box(Point(1, 0, 0), Point(5, 5, 5)), [self.red_brick, green_brick])
+        self.assertEqual(self.brick_map.bricks_in_box(Point(2, 0, 0), Point(5, 5, 5)), [green_brick])
+        self.assertEqual(self.brick_map.bricks_in_box(Point(0, 0, 1), Point(3, 0, 5)), [])
+
+    def test_bricks_in_box_skips_distant_cells(self):
+        far_brick = Brick("green", "1x1 green", [Point(40, 0, 40)])
+        self.brick_map.bricks = [self.red_brick, far_brick]
+        self.brick_map.build_index()
+
+        class Untouchable(list):
+            def __iter__(self):
+                raise AssertionError("bricks outside the queried cells must not be inspected")
+
+        # Only the index is consulted for the far brick, so its points are never read
+        far_brick.points = Untouchable(far_brick.points)
+        self.assertEqual(self.brick_map.bricks_in_box(Point(0, 0, 0), Point(3, 0, 3)), [self.red_brick])
+        self.assertEqual(self.brick_map.bricks_in_box(Point(-1000, 0, -1000), Point(3, 1000, 3)), [self.red_brick])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,7 +4,8 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from flask import Flask
 from flask.testing import FlaskClient
-from Controller import app, storage, last_failed_save_attempt
+from unittest import mock
+from Controller import app, storage, last_failed_save_attempt, indexed_maps, analysis_slots, MAX_CONCURRENT_ANALYSES
 from Brick import Brick, BrickMap, Point
 
 class TestController(unittest.TestCase):
@@ -19,6 +20,7 @@ class TestController(unittest.TestCase):
         
         # Clear the failed save attempt tracking
         last_failed_save_attempt.clear()
+        indexed_maps.clear()
 
     def test_save_map(self):
         brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
@@ -107,6 +109,127 @@ class TestController(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn('Invalid map data', data['error'])
 
+    def test_query_map_bricks(self):
+        map_id = "test_query_bricks"
+        brick_map = BrickMap(6, 2, 6, "Test Map", "2024-01-01T00:00:00")
+        red_brick = Brick("red", "2x1 red", [Point(0, 0, 0), Point(1, 0, 0)])
+        blue_brick = Brick("blue", "1x1 blue", [Point(4, 1, 4)])
+        brick_map.bricks = [red_brick, blue_brick]
+        storage.save_map(map_id, "tester", brick_map)
+
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=1')
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['bricks'], [blue_brick.to_dict()])
+
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?max_x=2')
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['bricks'], [red_brick.to_dict()])
+
+        # Unchanged map versions can be served from the client cache
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=1',
+                                   headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_query_map_bricks_cached_per_version(self):
+        map_id = "test_query_cache"
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+        storage.save_map(map_id, "tester", brick_map)
+
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=0')
+        etag = response.headers['ETag']
+        with mock.patch('Controller.BrickMap.from_dict') as from_dict:
+            # Later queries and revalidations do not parse the map again
+            response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=1')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=0', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            from_dict.assert_not_called()
+
+        # A new version of the map replaces the cached one
+        brick_map.bricks = [Brick("blue", "1x1 blue", [Point(0, 0, 0)])]
+        storage.save_map(map_id, "tester", brick_map)
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=0', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['bricks'][0]['color'], "blue")
+        self.assertEqual(len(indexed_maps), 1)
+
+    def test_query_map_bricks_invalid_query(self):
+        map_id = "test_query_invalid"
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+        storage.save_map(map_id, "tester", brick_map)
+
+        response = self.client.get(f'/caaluza/map/{map_id}/bricks?y=top')
+        self.assertEqual(response.status_code, 400)
+
+    def test_analyze_map(self):
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+
+        response = self.client.post('/caaluza/analyze?views=Top,North', json=brick_map.to_dict())
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['solutions'], 1)
+        self.assertTrue(data['unique'])
+
+        response = self.client.post('/caaluza/analyze?views=North&limit=2', json=brick_map.to_dict())
+        data = response.get_json()
+        self.assertEqual(data['solutions'], 2)
+        self.assertFalse(data['unique'])
+
+    def test_analyze_map_invalid_limits(self):
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+
+        for query in ['budget=nan', 'budget=inf', 'budget=-1', 'budget=0', 'limit=0']:
+            response = self.client.post(f'/caaluza/analyze?{query}', json=brick_map.to_dict())
+            self.assertEqual(response.status_code, 400, query)
+
+        # Budgets above the server-side cap are clamped rather than rejected
+        response = self.client.post('/caaluza/analyze?budget=100000', json=brick_map.to_dict())
+        self.assertEqual(response.status_code, 200)
+
+    def test_analyze_map_concurrency_limit(self):
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+
+        # Occupy every slot as if other analyses were running
+        for _ in range(MAX_CONCURRENT_ANALYSES):
+            analysis_slots.acquire()
+        try:
+            response = self.client.post('/caaluza/analyze', json=brick_map.to_dict())
+            self.assertEqual(response.status_code, 503)
+        finally:
+            for _ in range(MAX_CONCURRENT_ANALYSES):
+                analysis_slots.release()
+
+        # Slots are given back after each analysis, failed or not
+        for query in ['views=Bottom', 'views=Top', 'views=Top']:
+            self.client.post(f'/caaluza/analyze?{query}', json=brick_map.to_dict())
+        response = self.client.post('/caaluza/analyze', json=brick_map.to_dict())
+        self.assertEqual(response.status_code, 200)
+
+    def test_analyze_stored_map(self):
+        map_id = "test_analyze"
+        brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        brick_map.bricks = [Brick("red", "1x1 red", [Point(0, 0, 0)])]
+        storage.save_map(map_id, "tester", brick_map)
+
+        response = self.client.get(f'/caaluza/map/{map_id}/analysis')
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['unique'])
+
+        response = self.client.get(f'/caaluza/map/{map_id}/analysis?views=Bottom')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_bricks_nonexistent_map(self):
+        response = self.client.get('/caaluza/map/nonexistent_id/bricks?y=0')
+        self.assertEqual(response.status_code, 404)
+
 
 if __name__ == '__main__':
     unittest.main()
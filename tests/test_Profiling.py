@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+import json
+import pstats
+import shutil
+import tempfile
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Profiling
+from Controller import app
+from Brick import Brick, BrickMap, Point
+
+class TestRequestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        app.config['TESTING'] = True
+        self.profile_dir = tempfile.mkdtemp()
+        Profiling.PROFILE_DIR = self.profile_dir
+
+        self.brick_map = BrickMap(6, 1, 6, "Test Map", "2024-01-01T00:00:00")
+        self.brick_map.bricks = [Brick("red", "2x1 red", [Point(0, 0, 0), Point(1, 0, 0)])]
+
+    def tearDown(self):
+        Profiling.PROFILE_DIR = None
+        Profiling.PROFILE_SLOW_MS = None
+        Profiling.PROFILE_SAMPLE_RATE = None
+        shutil.rmtree(self.profile_dir)
+
+    def dumps(self, extension):
+        return [os.path.join(self.profile_dir, name) for name in os.listdir(self.profile_dir) if name.endswith(extension)]
+
+    def test_profile_header(self):
+        response = self.client.post('/caaluza/validate', json=self.brick_map.to_dict(),
+                                    headers={Profiling.PROFILE_HEADER: '1'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(len(self.dumps(".pstats")), 1)
+        self.assertEqual(len(self.dumps(".collapsed")), 1)
+        pstats.Stats(self.dumps(".pstats")[0])
+
+        metadata_files = self.dumps(".json")
+        self.assertEqual(len(metadata_files), 1)
+        self.assertIn("caaluza_validate_1b", metadata_files[0])
+        with open(metadata_files[0]) as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata['route'], '/caaluza/validate')
+        self.assertEqual(metadata['map_size'], 1)
+        self.assertTrue(metadata['cprofile'])
+
+    def test_profile_header_without_cprofile(self):
+        # E.g. another request is already being profiled with cProfile
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError("Another profiling tool is already active")):
+            response = self.client.post('/caaluza/validate', json=self.brick_map.to_dict(),
+                                        headers={Profiling.PROFILE_HEADER: '1'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.dumps(".pstats"), [])
+        self.assertEqual(len(self.dumps(".collapsed")), 1)
+        with open(self.dumps(".json")[0]) as f:
+            metadata = json.load(f)
+        self.assertFalse(metadata['cprofile'])
+
+    def test_unwritable_profile_dir(self):
+        not_a_directory = os.path.join(self.profile_dir, "file")
+        with open(not_a_directory, "w"):
+            pass
+        Profiling.PROFILE_DIR = os.path.join(not_a_directory, "dumps")
+
+        with self.assertLogs(level="ERROR"):
+            response = self.client.post('/caaluza/validate', json=self.brick_map.to_dict(),
+                                        headers={Profiling.PROFILE_HEADER: '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['valid'], True)
+
+    def test_unprofiled_request(self):
+        response = self.client.post('/caaluza/validate', json=self.brick_map.to_dict())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_slow_request_threshold(self):
+        Profiling.PROFILE_SLOW_MS = 0
+        self.client.post('/caaluza/validate', json=self.brick_map.to_dict())
+        self.assertEqual(len(self.dumps(".collapsed")), 1)
+        self.assertEqual(self.dumps(".pstats"), [])
+
+    def test_slow_request_threshold_sample_rate(self):
+        Profiling.PROFILE_SLOW_MS = 0
+        Profiling.PROFILE_SAMPLE_RATE = 0
+        self.client.post('/caaluza/validate', json=self.brick_map.to_dict())
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_sample_rate(self):
+        Profiling.PROFILE_SAMPLE_RATE = 1
+        self.client.post('/caaluza/validate', json=self.brick_map.to_dict())
+        self.assertEqual(len(self.dumps(".pstats")), 1)
+
+    def test_disabled_without_profile_dir(self):
+        Profiling.PROFILE_DIR = None
+        self.client.post('/caaluza/validate', json=self.brick_map.to_dict(),
+                         headers={Profiling.PROFILE_HEADER: '1'})
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
+class TestCollapse(unittest.TestCase):
+    def test_collapse_outermost_first(self):
+        def inner():
+            return sys._getframe()
+        stack = Profiling.collapse(inner()).split(";")
+        self.assertTrue(stack[-1].startswith("inner (test_Profiling.py:"))
+        self.assertTrue(stack[-2].startswith("test_collapse_outermost_first"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Brick import Point, Brick, BrickMap
+from Mapgenerator.Mapgenerator import BrickDef
+from Mapgenerator.Solver import project, count_solutions, analyze_map, analyze_maps, split_search, Puzzle
+
+class TestProject(unittest.TestCase):
+    def test_project_shows_nearest_point(self):
+        colored_points = {(0, 0, 0): "red", (0, 1, 0): "blue", (0, 0, 3): "green"}
+        self.assertEqual(project(colored_points, "Top"), {(0, 0): "blue", (0, 3): "green"})
+        self.assertEqual(project(colored_points, "North"), {(0, 0): "red", (0, 1): "blue"})
+        self.assertEqual(project(colored_points, "South"), {(0, 0): "green", (0, 1): "blue"})
+
+
+class TestCountSolutions(unittest.TestCase):
+    def setUp(self):
+        self.brick_map = BrickMap(6, 2, 6, "Test Map", "2024-01-01T00:00:00")
+        self.brick_map.bricks = [
+            Brick("red", "1x2 red", [Point(0, 0, 0), Point(1, 0, 0)]),
+            Brick("blue", "1x1 blue", [Point(0, 1, 0)]),
+            Brick("red", "1x1 red", [Point(4, 0, 4)]),
+        ]
+
+    def test_unique_from_all_views(self):
+        result = analyze_map(self.brick_map, ["Top", "North", "South", "West", "East"], processes=1)
+        self.assertEqual(result.solutions, 1)
+        self.assertTrue(result.complete)
+        self.assertTrue(result.unique)
+
+    def test_single_side_view_is_ambiguous(self):
+        pieces = [BrickDef(1, 1, "red", frozenset())]
+        result = count_solutions({"North": {(0, 0): "red"}}, pieces, processes=1)
+        # The brick can be anywhere along the line of sight
+        self.assertEqual(result.solutions, 6)
+        self.assertFalse(result.unique)
+
+    def test_identical_pieces_are_not_counted_twice(self):
+        pieces = [BrickDef(1, 1, "red", frozenset()), BrickDef(1, 1, "red", frozenset())]
+        result = count_solutions({"Top": {(0, 0): "red", (1, 0): "red"}}, pieces, processes=1)
+        self.assertEqual(result.solutions, 1)
+
+    def test_max_solutions(self):
+        pieces = [BrickDef(1, 1, "red", frozenset())]
+        result = count_solutions({"North": {(0, 0): "red"}}, pieces, max_solutions=2, processes=1)
+        self.assertEqual(result.solutions, 2)
+        self.assertFalse(result.complete)
+
+    def test_process_pool_matches_serial_search(self):
+        serial = analyze_map(self.brick_map, ["Top", "North"], processes=1)
+        parallel = analyze_map(self.brick_map, ["Top", "North"], processes=2)
+        self.assertEqual(serial.solutions, parallel.solutions)
+        self.assertEqual(serial.nodes, parallel.nodes)
+
+    def test_split_search_finds_enough_tasks(self):
+        pieces = [BrickDef(1, 1, "red", frozenset()), BrickDef(1, 1, "blue", frozenset())]
+        puzzle = Puzzle({"North": {(0, 0): "red", (1, 0): "blue"}}, pieces)
+        # The first piece alone has six placements, so the split goes one level deeper
+        prefixes, _ = split_search(puzzle, 8)
+        self.assertEqual(len(prefixes), 36)
+        self.assertEqual({len(prefix) for prefix in prefixes}, {2})
+
+    def test_process_pool_matches_serial_search_when_split(self):
+        pieces = [BrickDef(1, 1, color, frozenset()) for color in ["red", "blue", "green"]]
+        projections = {"North": {(0, 0): "red", (1, 0): "blue", (2, 0): "green"}}
+        serial = count_solutions(projections, pieces, processes=1)
+        parallel = count_solutions(projections, pieces, processes=2)
+        self.assertEqual(serial.solutions, 216)
+        self.assertEqual(parallel.solutions, 216)
+        self.assertEqual(serial.nodes, parallel.nodes)
+
+    def test_max_solutions_across_process_pool(self):
+        pieces = [BrickDef(1, 1, color, frozenset()) for color in ["red", "blue", "green"]]
+        projections = {"North": {(0, 0): "red", (1, 0): "blue", (2, 0): "green"}}
+        result = count_solutions(projections, pieces, max_solutions=2, processes=2)
+        self.assertEqual(result.solutions, 2)
+        self.assertFalse(result.complete)
+
+    def test_invalid_limits(self):
+        pieces = [BrickDef(1, 1, "red", frozenset())]
+        with self.assertRaises(ValueError):
+            count_solutions({"North": {(0, 0): "red"}}, pieces, max_solutions=0, processes=1)
+        with self.assertRaises(ValueError):
+            count_solutions({"North": {(0, 0): "red"}}, pieces, time_budget=-1, processes=1)
+
+    def test_unknown_view(self):
+        with self.assertRaises(ValueError):
+            analyze_map(self.brick_map, ["Bottom"], processes=1)
+
+    def test_analyze_maps(self):
+        results = analyze_maps([self.brick_map, self.brick_map], ["Top"], processes=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].solutions, results[1].solutions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Brick import BrickMap
+from loadtest import percentile, generated_map, count_lock_errors, run_load, start_server_process
+
+class TestPercentile(unittest.TestCase):
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+
+    def test_percentile_single_sample(self):
+        self.assertEqual(percentile([3], 99), 3)
+
+    def test_percentile_no_samples(self):
+        self.assertIsNone(percentile([], 50))
+
+
+class TestGeneratedMap(unittest.TestCase):
+    def test_generated_map_is_a_brick_map(self):
+        brick_map = BrickMap.from_dict(generated_map("user0"))
+        self.assertGreater(len(brick_map.bricks), 0)
+
+
+class TestCountLockErrors(unittest.TestCase):
+    def test_count_lock_errors(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as f:
+            f.write("Exception on /caaluza/map/a [POST]\n")
+            f.write("sqlite3.OperationalError: database is locked\n")
+            f.write("Exception on /caaluza/map/b [POST]\n")
+        try:
+            self.assertEqual(count_lock_errors(f.name), 1)
+        finally:
+            os.remove(f.name)
+
+
+class TestRunLoad(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.log_file = open(os.path.join(self.workdir, "server.log"), "w")
+        self.server, self.base_url = start_server_process("controller", self.log_file,
+                                                          os.path.join(self.workdir, "loadtest.sqlite"))
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        self.log_file.close()
+        shutil.rmtree(self.workdir)
+
+    def test_run_load(self):
+        report = run_load(self.base_url, users=2, iterations=2, client_processes=2)
+        self.assertEqual(report['routes']['POST /caaluza/validate']['count'], 4)
+        self.assertEqual(report['routes']['GET /caaluza/map/<id>']['count'], 4)
+        for route in report['routes'].values():
+            self.assertEqual(route['errors'], 0)
+            self.assertLessEqual(route['p50_ms'], route['p99_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()